@@ -1,10 +1,9 @@
-import pyvisa
+from visa_utils import USB_QUERY, get_rm
 
 def list_visa_resources():
-    rm = pyvisa.ResourceManager('/Library/Frameworks/VISA.framework/VISA')
-    resources = rm.list_resources()
+    resources = get_rm().list_resources(USB_QUERY)
     if resources:
-        print("Available VISA resources:")
+        print("Available USB VISA resources:")
         for r in resources:
             print(f"  - {r}")
     else:
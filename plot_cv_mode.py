@@ -1,8 +1,35 @@
+import os
 import tkinter as tk
 from tkinter import filedialog
 import numpy as np
+from numba import njit
+import pandas as pd
+import matplotlib
+INTERACTIVE = True  # Show plots in a window; set False to render PNGs headless (Agg)
+if not INTERACTIVE:
+    matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-import csv
+
+# ==== FILTER + MPP KERNEL ====
+# Single pass over (V, I, P) rows: keep rows where all three are > 0 (NaNs
+# from unparsable cells fail the test too) and track the max-power row
+@njit(cache=True)
+def scan(a):
+    out = np.empty_like(a)
+    k = 0
+    best = -1.0
+    best_i = -1
+    for i in range(a.shape[0]):
+        v, c, p = a[i, 0], a[i, 1], a[i, 2]
+        if v > 0 and c > 0 and p > 0:
+            out[k, 0] = v
+            out[k, 1] = c
+            out[k, 2] = p
+            if p > best:
+                best = p
+                best_i = k
+            k += 1
+    return out[:k], best_i
 
 # ==== FILE SELECTION ====
 root = tk.Tk()
@@ -18,34 +45,19 @@ if not file_path:
     exit()
 
 # ==== DATA LOADING ====
-voltages = []
-currents = []
-powers = []
+COLUMNS = ["Voltage (V)", "Current (A)", "Power (W)"]
 
-with open(file_path, 'r') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        try:
-            v = float(row["Voltage (V)"])
-            i = float(row["Current (A)"])
-            p = float(row["Power (W)"])
-            if v > 0 and i > 0 and p > 0:  # Filter out 0s and negatives
-                voltages.append(v)
-                currents.append(i)
-                powers.append(p)
-        except ValueError:
-            continue
+df = pd.read_csv(file_path, usecols=COLUMNS, engine="c", on_bad_lines="skip")
+df = df.apply(pd.to_numeric, errors="coerce")  # Unparsable cells become NaN
+data, max_idx = scan(df[COLUMNS].to_numpy(dtype=np.float64))  # Filter out 0s, negatives and NaNs
 
-if not voltages:
+if max_idx < 0:
     print("⚠️ No valid data after filtering. Check CSV content.")
     exit()
 
-voltages = np.array(voltages)
-currents = np.array(currents)
-powers = np.array(powers)
+voltages, currents, powers = data.T
 
 # ==== MAX POWER POINT ====
-max_idx = np.argmax(powers)
 v_mpp = voltages[max_idx]
 i_mpp = currents[max_idx]
 p_mpp = powers[max_idx]
@@ -64,4 +76,10 @@ plt.ylabel("Current (A) / Power (W)")
 plt.grid(True)
 plt.legend()
 plt.tight_layout()
-plt.show()
+
+if INTERACTIVE:
+    plt.show()
+else:
+    png_path = os.path.splitext(file_path)[0] + ".png"
+    plt.savefig(png_path, dpi=120)
+    print(f"📁 Plot saved to {png_path}")
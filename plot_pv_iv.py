@@ -1,11 +1,16 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import zscore
-import tkinter as tk
-from tkinter import filedialog
+import functools
+import os
+import numpy as np
+
+INTERACTIVE = True  # Show plots in a window; set False to render PNGs headless (Agg)
+
+_figure = None  # (fig, axes) reused across plot calls
 
 # Prompt for CSV file
 def select_csv_file():
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()  # Hide the root window
     filepath = filedialog.askopenfilename(
@@ -14,45 +19,124 @@ def select_csv_file():
     )
     return filepath
 
-# Filter outliers using z-score and min thresholds
-def filter_outliers(df, z_thresh=3.0, voltage_min=0.05, current_min=0.001):
+# Hampel filter on the residuals from a 3-point running median, so the
+# curve's own slope and sample spacing are not mistaken for noise. Only
+# points with a full window (window = points on each side) are tested, the
+# MAD is floored at mad_floor * the power span of the other points in the
+# window, and the max-power point is rejected only if both of its
+# neighbours disagree with it.
+#
+# Built on first use so numba is only imported (and the kernel JIT-compiled
+# or loaded from its on-disk cache) once outliers are actually filtered.
+@functools.lru_cache(maxsize=1)
+def _hampel_kernel():
+    from numba import njit, prange
+
+    @njit(parallel=True, cache=True)
+    def hampel(p, window=3, n_sigmas=3.0, mad_floor=1.0):
+        n = p.shape[0]
+        keep = np.ones(n, dtype=np.bool_)
+        resid = np.zeros(n)
+        for i in prange(1, n - 1):
+            a, b, c = p[i - 1], p[i], p[i + 1]
+            resid[i] = b - max(min(a, b), min(max(a, b), c))  # Residual from median of 3
+        thresh = np.full(n, np.inf)
+        for i in prange(window, n - window):
+            w = resid[i - window:i + window + 1]
+            median = np.median(w)
+            mad = 1.4826 * np.median(np.abs(w - median))  # Scaled to match std for normal data
+            others = np.concatenate((p[i - window:i], p[i + 1:i + window + 1]))
+            span = others.max() - others.min()
+            thresh[i] = n_sigmas * max(mad, mad_floor * span)
+            if np.abs(resid[i] - median) > thresh[i]:
+                keep[i] = False
+        i_max = np.argmax(p)
+        if not keep[i_max] and not (p[i_max] - p[i_max - 1] > thresh[i_max]
+                                    and p[i_max] - p[i_max + 1] > thresh[i_max]):
+            keep[i_max] = True
+        return keep
+
+    return hampel
+
+# Filter outliers using a Hampel filter along the voltage axis and min thresholds
+def filter_outliers(df, window=3, n_sigmas=3.0, voltage_min=0.05, current_min=0.001):
     df_filtered = df[
         (df["Voltage (V)"] > voltage_min) & 
         (df["Current (A)"] > current_min)
-    ]
-    df_filtered = df_filtered[(zscore(df_filtered["Power (W)"]) < z_thresh)]
+    ].sort_values("Voltage (V)", kind="stable")
+    if len(df_filtered) <= 2 * window:
+        return df_filtered  # No point has a full window to test against
+    mask = _hampel_kernel()(df_filtered["Power (W)"].to_numpy(dtype=np.float64), window, n_sigmas)
+    df_filtered = df_filtered[mask]
     return df_filtered
 
-# Plot IV and PV curves side-by-side with MPP marker
-def plot_filtered_curves(df):
+# Side-by-side I-V / P-V figure, created once and reused while its window is open
+def get_figure():
+    global _figure
+    import matplotlib
+    if not INTERACTIVE:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if _figure is None or not plt.fignum_exists(_figure[0].number):
+        plt.rcParams['path.simplify'] = True
+        plt.rcParams['path.simplify_threshold'] = 1.0  # Drop sub-pixel vertices on long sweeps
+        _figure = plt.subplots(1, 2, figsize=(12, 6))
+    return _figure
+
+# Update the curve and MPP artists in place (created lazily on the first call)
+def update_plot(fig, axes, v, i, p, mpp):
+    ax_iv, ax_pv = axes
+    v_mpp, i_mpp, p_mpp = mpp
+
+    if not hasattr(fig, "curve_lines"):
+        # I-V Curve subplot
+        iv_line, = ax_iv.plot([], [], 'bo-', label='I-V Curve')
+        iv_mpp, = ax_iv.plot([], [], 'r*', markersize=15, label='MPP Point')
+        ax_iv.set_xlabel("Voltage (V)")
+        ax_iv.set_ylabel("Current (A)")
+        ax_iv.set_title("Filtered I-V Curve")
+        ax_iv.grid(True)
+
+        # P-V Curve subplot
+        pv_line, = ax_pv.plot([], [], 'ro-', label='P-V Curve')
+        pv_mpp, = ax_pv.plot([], [], 'k*', markersize=15)
+        ax_pv.set_xlabel("Voltage (V)")
+        ax_pv.set_ylabel("Power (W)")
+        ax_pv.set_title("Filtered Power Curve")
+        ax_pv.grid(True)
+
+        fig.curve_lines = (iv_line, iv_mpp, pv_line, pv_mpp)
+
+    iv_line, iv_mpp, pv_line, pv_mpp = fig.curve_lines
+    iv_line.set_data(v, i)
+    iv_mpp.set_data([v_mpp], [i_mpp])
+    pv_line.set_data(v, p)
+    pv_mpp.set_data([v_mpp], [p_mpp])
+    pv_mpp.set_label(f'MPP: {p_mpp:.2f} W @ {v_mpp:.2f} V')
+
+    for ax in axes:
+        ax.relim()
+        ax.autoscale_view()
+        ax.legend()
+    fig.canvas.draw_idle()
+
+# Plot IV and PV curves side-by-side with MPP marker (saved to png_path if given)
+def plot_filtered_curves(df, png_path=None):
     max_idx = df["Power (W)"].idxmax()
     max_row = df.loc[max_idx]
 
-    plt.figure(figsize=(12, 6))
-
-    # I-V Curve subplot
-    plt.subplot(1, 2, 1)
-    plt.plot(df["Voltage (V)"], df["Current (A)"], 'bo-', label='I-V Curve')
-    plt.plot(max_row["Voltage (V)"], max_row["Current (A)"], 'r*', markersize=15, label='MPP Point')
-    plt.xlabel("Voltage (V)")
-    plt.ylabel("Current (A)")
-    plt.title("Filtered I-V Curve")
-    plt.grid(True)
-    plt.legend()
-
-    # P-V Curve subplot
-    plt.subplot(1, 2, 2)
-    plt.plot(df["Voltage (V)"], df["Power (W)"], 'ro-', label='P-V Curve')
-    plt.plot(max_row["Voltage (V)"], max_row["Power (W)"], 'k*', markersize=15,
-             label=f'MPP: {max_row["Power (W)"]:.2f} W @ {max_row["Voltage (V)"]:.2f} V')
-    plt.xlabel("Voltage (V)")
-    plt.ylabel("Power (W)")
-    plt.title("Filtered Power Curve")
-    plt.grid(True)
-    plt.legend()
-
-    plt.tight_layout()
-    plt.show()
+    fig, axes = get_figure()
+    update_plot(fig, axes, df["Voltage (V)"], df["Current (A)"], df["Power (W)"],
+                (max_row["Voltage (V)"], max_row["Current (A)"], max_row["Power (W)"]))
+
+    fig.tight_layout()
+    if png_path:
+        fig.savefig(png_path, dpi=120)
+        print(f"📁 Plot saved to {png_path}")
+    else:
+        import matplotlib.pyplot as plt
+        plt.show()
 
     print(f"\n✅ MPP: {max_row['Power (W)']:.2f} W at {max_row['Voltage (V)']:.2f} V, {max_row['Current (A)']:.2f} A")
 
@@ -62,8 +146,10 @@ if not csv_path:
     print("❌ No file selected. Exiting.")
 else:
     try:
+        import pandas as pd
         df = pd.read_csv(csv_path)
         filtered_df = filter_outliers(df)
-        plot_filtered_curves(filtered_df)
+        png_path = None if INTERACTIVE else os.path.splitext(csv_path)[0] + ".png"
+        plot_filtered_curves(filtered_df, png_path)
     except Exception as e:
         print(f"❌ Error: {e}")
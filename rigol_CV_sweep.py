@@ -1,11 +1,7 @@
-import pyvisa
 import numpy as np
-import matplotlib.pyplot as plt
 import time
-import csv
 from datetime import datetime
-import tkinter as tk
-from tkinter import filedialog
+from visa_utils import measure_vi, open_dl3031
 
 # ==== CONFIGURATION ====
 V_START = 0.0           # Start voltage (V)
@@ -17,21 +13,17 @@ DWELL_TIME = 0.5        # Wait time per step (seconds)
 MAX_CURRENT = 20.0       # Max current limit (A)
 MAX_POWER = 50.0         # Max power limit (W)
 
+# === OUTPUT ===
+INTERACTIVE = True  # Show plots in a window; set False to render PNGs headless (Agg)
+
 # === FILE NAMING ===
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
 print("=== Starting Rigol DL3031 IV/PV CV-mode sweep ===")
 
 # ==== VISA SETUP ====
-rm = pyvisa.ResourceManager('/Library/Frameworks/VISA.framework/VISA')
-usb_instruments = [r for r in rm.list_resources() if 'USB' in r]
-
-if not usb_instruments:
-    raise RuntimeError("No USB instruments found. Check connections and drivers.")
-
-resource = usb_instruments[0]
-print(f"✅ Connecting to: {resource}")
-inst = rm.open_resource(resource)
+inst = open_dl3031()
+print(f"✅ Connected to: {inst.resource_name}")
 
 inst.timeout = 5000
 inst.write_termination = '\n'
@@ -46,19 +38,20 @@ inst.write(":INPUT ON")                  # Turn on the electronic load
 inst.write(f":VOLT:LIM {V_STOP:.2f}")    # Set voltage limit
 inst.write(f":CURR:LIM {MAX_CURRENT:.2f}")  # Set current limit
 
-voltages = []
-currents = []
-powers = []
+v_targets = np.arange(V_START, V_STOP + V_STEP, V_STEP)
+
+N = len(v_targets)
+data = np.empty((N, 3), order='F')  # Columns: V, I, P (column-major, each column contiguous)
+k = 0  # Number of points recorded
 
 try:
     print("\n⚡ Starting CV voltage sweep...")
-    for v_target in np.arange(V_START, V_STOP + V_STEP, V_STEP):
-        inst.write(f":VOLT {v_target:.2f}")  # Set target voltage
+    for v_target in v_targets:
+        inst.write_raw(b":VOLT %.2f\n" % v_target)  # Set target voltage (raw bytes, termination included)
         time.sleep(DWELL_TIME)
 
-        voltage = float(inst.query(":MEAS:VOLT?"))
-        current = float(inst.query(":MEAS:CURR?"))
-        power = voltage * current
+        voltage, current = measure_vi(inst)
+        power = voltage * current  # Printout and safety check only; stored after the sweep
 
         print(f"📍 V={voltage:.2f} V | I={current:.2f} A | P={power:.2f} W")
 
@@ -70,9 +63,9 @@ try:
             print(f"🚨 Power limit exceeded! ({power:.2f} W > {MAX_POWER} W). Stopping sweep.")
             break
 
-        voltages.append(voltage)
-        currents.append(current)
-        powers.append(power)
+        data[k, 0] = voltage
+        data[k, 1] = current
+        k += 1
 
 except KeyboardInterrupt:
     print("\n⛔ Sweep manually interrupted.")
@@ -82,11 +75,10 @@ finally:
     print("\n🛑 Load disabled. Sweep complete or aborted.")
 
 # ==== ANALYSIS ====
-if voltages:
-    voltages = np.array(voltages)
-    currents = np.array(currents)
-    powers = np.array(powers)
+data[:k, 2] = data[:k, 0] * data[:k, 1]  # Power column in one vectorized pass
+voltages, currents, powers = data[:k, 0], data[:k, 1], data[:k, 2]
 
+if k:
     max_idx = np.argmax(powers)
     v_mpp = voltages[max_idx]
     i_mpp = currents[max_idx]
@@ -97,7 +89,10 @@ if voltages:
     # ==== ASK TO SAVE CSV WITH FILE DIALOG ====
     save_input = input("\n💾 Would you like to save the I-V/P-V data to CSV? (y/n): ").strip().lower()
     if save_input == 'y':
-        # Tkinter file save dialog
+        # Tkinter file save dialog (imported only when saving)
+        import tkinter as tk
+        from tkinter import filedialog
+
         root = tk.Tk()
         root.withdraw()  # Hide main window
         default_filename = f"iv_pv_data_{timestamp}.csv"
@@ -108,10 +103,8 @@ if voltages:
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
         )
         if file_path:
-            with open(file_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Voltage (V)", "Current (A)", "Power (W)"])
-                writer.writerows(zip(voltages, currents, powers))
+            np.savetxt(file_path, data[:k], fmt='%.6g',
+                       delimiter=',', header="Voltage (V),Current (A),Power (W)", comments='')
             print(f"📁 Data saved to {file_path}")
         else:
             print("❌ Save cancelled. CSV not saved.")
@@ -119,6 +112,11 @@ if voltages:
         print("❌ CSV not saved.")
 
     # ==== PLOTTING ====
+    import matplotlib  # Deferred until after the sweep to keep startup fast
+    if not INTERACTIVE:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 6))
 
     plt.subplot(1, 2, 1)
@@ -138,7 +136,13 @@ if voltages:
     plt.grid(True)
 
     plt.tight_layout()
-    plt.show()
+
+    if INTERACTIVE:
+        plt.show()
+    else:
+        png_path = f"iv_pv_CV_curve_{timestamp}.png"
+        plt.savefig(png_path, dpi=120)
+        print(f"📁 Plot saved to {png_path}")
 
 else:
     print("⚠️ No data collected. Check sweep limits and setup.")
@@ -1,11 +1,7 @@
-import pyvisa
 import numpy as np
-import matplotlib.pyplot as plt
 import time
-import csv
 from datetime import datetime
-import tkinter as tk
-from tkinter import filedialog
+from visa_utils import measure_vi, open_dl3031
 
 # ==== CONFIGURATION ====
 V_START = 0.0         # Start voltage (V)
@@ -26,21 +22,17 @@ LOW_RANGE_MAX = 15.0    # Ohms
 HIGH_RANGE_MIN = 2.0    # Ohms
 HIGH_RANGE_MAX = 15000  # Ohms (15 kΩ)
 
+# === OUTPUT ===
+INTERACTIVE = True  # Show plots in a window; set False to render PNGs headless (Agg)
+
 # === FILE NAMING ===
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
 print("=== Starting Rigol DL3031 IV/PV sweep script with enhanced safeguards ===")
 
 # ==== VISA SETUP ====
-rm = pyvisa.ResourceManager('/Library/Frameworks/VISA.framework/VISA')
-usb_instruments = [r for r in rm.list_resources() if 'USB' in r]
-
-if not usb_instruments:
-    raise RuntimeError("No USB instruments found. Check connections and drivers.")
-
-resource = usb_instruments[0]
-print(f"✅ Connecting to: {resource}")
-inst = rm.open_resource(resource)
+inst = open_dl3031()
+print(f"✅ Connected to: {inst.resource_name}")
 
 inst.timeout = 5000
 inst.write_termination = '\n'
@@ -51,35 +43,30 @@ print("🆔 Instrument ID:", inst.query("*IDN?"))
 
 # ==== LOAD SETUP ====
 inst.write(":FUNC RES")          # Set function mode to Constant Resistance (CR)
+inst.write(":RANGE LOW")         # Low resistance range for the whole sweep
 inst.write(":INPUT ON")          # Turn on the electronic load
 inst.write(f":VOLT:LIM {V_STOP:.2f}")    # Set voltage limit
 inst.write(f":CURR:LIM {MAX_CURRENT:.2f}")  # Set current limit
 
-voltages = []
-currents = []
-powers = []
+# ==== RESISTANCE SCHEDULE ====
+v_targets = np.arange(V_START, V_STOP + V_STEP, V_STEP)
+resistances = np.where(v_targets > 0, v_targets / ESTIMATED_CURRENT, MIN_RESISTANCE)
+np.clip(resistances, MIN_RESISTANCE, MAX_RESISTANCE, out=resistances)  # Clamp within allowed bounds
+
+N = len(v_targets)
+data = np.empty((N, 3), order='F')  # Columns: V, I, P (column-major, each column contiguous)
+k = 0  # Number of points recorded
 
 try:
     print("\n⚡ Starting sweep...")
-    for v_target in np.arange(V_START, V_STOP + V_STEP, V_STEP):
-        resistance = v_target / ESTIMATED_CURRENT if v_target > 0 else MIN_RESISTANCE
-
-        # Clamp resistance within allowed bounds
-        if resistance < MIN_RESISTANCE:
-            resistance = MIN_RESISTANCE
-        elif resistance > MAX_RESISTANCE:
-            resistance = MAX_RESISTANCE
-
-        inst.write(":RANGE LOW")
-
-        # Set resistance
-        inst.write(f":RES {resistance:.3f}")
+    for v_target, resistance in zip(v_targets, resistances):
+        # Set resistance (raw bytes, termination included)
+        inst.write_raw(b":RES %.3f\n" % resistance)
 
         time.sleep(DWELL_TIME)
 
-        voltage = float(inst.query(":MEAS:VOLT?"))
-        current = float(inst.query(":MEAS:CURR?"))
-        power = voltage * current
+        voltage, current = measure_vi(inst)
+        power = voltage * current  # Printout and safety check only; stored after the sweep
 
         print(f"📍 V={voltage:.2f} V | I={current:.2f} A | P={power:.2f} W")
 
@@ -91,9 +78,9 @@ try:
             print(f"🚨 Power limit exceeded! ({power:.2f} W > {MAX_POWER} W). Stopping sweep.")
             break
 
-        voltages.append(voltage)
-        currents.append(current)
-        powers.append(power)
+        data[k, 0] = voltage
+        data[k, 1] = current
+        k += 1
 
 except KeyboardInterrupt:
     print("\n⛔ Sweep manually interrupted.")
@@ -103,11 +90,10 @@ finally:
     print("\n🛑 Load disabled. Sweep complete or aborted.")
 
 # ==== ANALYSIS ====
-if voltages:
-    voltages = np.array(voltages)
-    currents = np.array(currents)
-    powers = np.array(powers)
+data[:k, 2] = data[:k, 0] * data[:k, 1]  # Power column in one vectorized pass
+voltages, currents, powers = data[:k, 0], data[:k, 1], data[:k, 2]
 
+if k:
     max_idx = np.argmax(powers)
     v_mpp = voltages[max_idx]
     i_mpp = currents[max_idx]
@@ -118,7 +104,10 @@ if voltages:
     # ==== ASK TO SAVE CSV WITH FILE DIALOG ====
     save_input = input("\n💾 Would you like to save the I-V/P-V data to CSV? (y/n): ").strip().lower()
     if save_input == 'y':
-        # Tkinter file save dialog
+        # Tkinter file save dialog (imported only when saving)
+        import tkinter as tk
+        from tkinter import filedialog
+
         root = tk.Tk()
         root.withdraw()  # Hide main window
         default_filename = f"iv_pv_data_{timestamp}.csv"
@@ -129,10 +118,8 @@ if voltages:
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
         )
         if file_path:
-            with open(file_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Voltage (V)", "Current (A)", "Power (W)"])
-                writer.writerows(zip(voltages, currents, powers))
+            np.savetxt(file_path, data[:k], fmt='%.6g',
+                       delimiter=',', header="Voltage (V),Current (A),Power (W)", comments='')
             print(f"📁 Data saved to {file_path}")
         else:
             print("❌ Save cancelled. CSV not saved.")
@@ -140,6 +127,11 @@ if voltages:
         print("❌ CSV not saved.")
 
     # ==== PLOTTING ====
+    import matplotlib  # Deferred until after the sweep to keep startup fast
+    if not INTERACTIVE:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 6))
 
     plt.subplot(1, 2, 1)
@@ -159,7 +151,13 @@ if voltages:
     plt.grid(True)
 
     plt.tight_layout()
-    plt.show()
+
+    if INTERACTIVE:
+        plt.show()
+    else:
+        png_path = f"iv_pv_curve_{timestamp}.png"
+        plt.savefig(png_path, dpi=120)
+        print(f"📁 Plot saved to {png_path}")
 
 else:
     print("⚠️ No data collected. Check sweep limits and setup.")
@@ -1,27 +1,27 @@
 #!/usr/bin/env python3
 # MPPT Sweep Script for Rigol DL3031
-import pyvisa
+import sys
 import numpy as np
 import time
-import matplotlib.pyplot as plt
 from datetime import datetime
-import csv
+from visa_utils import measure_vi, open_dl3031
 
 # === Sweep Configuration ===
 R_START = 15000     # Ohms (open circuit)
 R_STOP = 0.05       # Ohms (short circuit)
-R_STEP = -100       # Decreasing resistance
+R_POINTS = 80       # Log-spaced points for the full (--full) sweep
+R_COARSE = 8        # Log-spaced points used to bracket the MPP
+R_TOL = 0.01        # Golden-section stop width (decades of resistance)
 DWELL = 0.3         # Time between points (seconds)
 VOLTAGE_LIMIT = 10  # Max voltage limit for protection
 
+INTERACTIVE = True  # Show plots in a window; set False to render PNGs headless (Agg)
+FULL_SWEEP = "--full" in sys.argv  # Full sweep for diagnostics instead of the MPP search
+
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
 # === Initialize VISA ===
-rm = pyvisa.ResourceManager('/Library/Frameworks/VISA.framework/VISA')
-instruments = [r for r in rm.list_resources() if 'USB' in r]
-if not instruments:
-    raise RuntimeError("No Rigol device found.")
-inst = rm.open_resource(instruments[0])
+inst = open_dl3031()
 inst.timeout = 5000
 inst.write_termination = '\n'
 inst.read_termination = '\n'
@@ -34,35 +34,68 @@ inst.write(":INPUT ON")
 inst.write(f":VOLT:LIM {VOLTAGE_LIMIT:.2f}")
 
 # === Sweep ===
-resistances = []
-voltages = []
-currents = []
-powers = []
-
-print("\nStarting MPPT sweep...")
+INV_PHI = (np.sqrt(5) - 1) / 2  # 1/golden ratio
+
+if FULL_SWEEP:
+    R_values = np.geomspace(R_START, R_STOP, num=R_POINTS)
+    N = R_POINTS
+else:
+    R_values = np.geomspace(R_START, R_STOP, num=R_COARSE)
+    bracket = 2 * np.log10(R_START / R_STOP) / (R_COARSE - 1)  # Two coarse steps, in decades
+    # Coarse points + 2 initial golden points + 1 per iteration (+1 spare for rounding)
+    N = R_COARSE + 3 + int(np.ceil(np.log(R_TOL / bracket) / np.log(INV_PHI)))
+
+data = np.empty((N, 4), order='F')  # Columns: R, V, I, P (column-major, each column contiguous)
+k = 0  # Number of points recorded
+
+# Set R, wait for the load to settle and record the point
+def measure_point(R):
+    global k
+    inst.write_raw(b":RES %.3f\n" % R)  # Raw bytes, termination included
+    time.sleep(DWELL)
+
+    V, I = measure_vi(inst)
+    P = V * I  # For the search; stored after the sweep
+
+    print(f"R={R:.3f} Ω | V={V:.2f} V | I={I:.2f} A | P={P:.2f} W")
+
+    data[k, 0] = R
+    data[k, 1] = V
+    data[k, 2] = I
+    k += 1
+    return V, P
+
+# Golden-section search for the maximum of a unimodal f on [lo, hi]
+def golden_search(f, lo, hi, tol):
+    c = hi - INV_PHI * (hi - lo)
+    d = lo + INV_PHI * (hi - lo)
+    fc, fd = f(c), f(d)
+    while hi - lo > tol:
+        if fc > fd:
+            hi, d, fd = d, c, fc
+            c = hi - INV_PHI * (hi - lo)
+            fc = f(c)
+        else:
+            lo, c, fc = c, d, fd
+            d = lo + INV_PHI * (hi - lo)
+            fd = f(d)
+    return (lo + hi) / 2
+
+print("\nStarting MPPT sweep..." if FULL_SWEEP else "\nStarting MPPT search...")
 
 try:
-    R = R_START
-    while R >= R_STOP:
-        inst.write(f":RES {R:.2f}")
-        time.sleep(DWELL)
-
-        V = float(inst.query(":MEAS:VOLT?"))
-        I = float(inst.query(":MEAS:CURR?"))
-        P = V * I
-
-        print(f"R={R:.2f} Ω | V={V:.2f} V | I={I:.2f} A | P={P:.2f} W")
-
-        resistances.append(R)
-        voltages.append(V)
-        currents.append(I)
-        powers.append(P)
-
+    for R in R_values:
+        V, P = measure_point(R)
         if V < 0.05:  # Assume Isc reached
             print("Voltage near zero — stopping sweep.")
             break
 
-        R += R_STEP
+    if not FULL_SWEEP:
+        # P(R) is unimodal: refine between the neighbours of the best coarse point (in log R)
+        best = np.argmax(data[:k, 1] * data[:k, 2])
+        lo = np.log10(R_values[min(best + 1, len(R_values) - 1)])
+        hi = np.log10(R_values[max(best - 1, 0)])
+        golden_search(lambda x: measure_point(10 ** x)[1], lo, hi, R_TOL)
 
 except KeyboardInterrupt:
     print("Interrupted manually.")
@@ -72,9 +105,9 @@ finally:
     print("Load disabled.")
 
 # === Analyze ===
-voltages = np.array(voltages)
-currents = np.array(currents)
-powers = np.array(powers)
+data[:k, 3] = data[:k, 1] * data[:k, 2]  # Power column in one vectorized pass
+data = data[:k][np.argsort(data[:k, 0])[::-1]]  # Search points arrive out of order
+voltages, currents, powers = data[:, 1], data[:, 2], data[:, 3]
 
 max_idx = np.argmax(powers)
 v_mpp, i_mpp, p_mpp = voltages[max_idx], currents[max_idx], powers[max_idx]
@@ -83,13 +116,16 @@ print(f"\n✅ MPP = {p_mpp:.2f} W @ {v_mpp:.2f} V, {i_mpp:.2f} A")
 
 # === Save CSV ===
 filename = f"dl3031_mppt_data_{timestamp}.csv"
-with open(filename, 'w', newline='') as f:
-    writer = csv.writer(f)
-    writer.writerow(["Resistance (Ohm)", "Voltage (V)", "Current (A)", "Power (W)"])
-    writer.writerows(zip(resistances, voltages, currents, powers))
+np.savetxt(filename, data, fmt='%.6g',
+           delimiter=',', header="Resistance (Ohm),Voltage (V),Current (A),Power (W)", comments='')
 print(f"Data saved to {filename}")
 
 # === Plot ===
+import matplotlib  # Deferred until after the sweep to keep startup fast
+if not INTERACTIVE:
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
 plt.figure(figsize=(10, 5))
 plt.subplot(1, 2, 1)
 plt.plot(voltages, currents, 'b.-')
@@ -108,4 +144,10 @@ plt.grid(True)
 plt.legend()
 
 plt.tight_layout()
-plt.show()
+
+if INTERACTIVE:
+    plt.show()
+else:
+    png_path = f"dl3031_mppt_curve_{timestamp}.png"
+    plt.savefig(png_path, dpi=120)
+    print(f"Plot saved to {png_path}")
@@ -0,0 +1,78 @@
+import functools
+from pathlib import Path
+
+import pyvisa
+
+VISA_LIBRARY = '/Library/Frameworks/VISA.framework/VISA'
+USB_QUERY = 'USB?*INSTR'  # Resource filter applied by VISA, skips serial/TCPIP enumeration
+RESOURCE_CACHE = Path("~/.rigol_resource").expanduser()  # Last verified DL3031 resource string
+MEAS_VI = b":MEAS:VOLT?;:MEAS:CURR?\n"  # Pre-encoded V/I query, termination included
+
+# One ResourceManager per process (opening it enumerates the VISA backends)
+@functools.lru_cache(maxsize=1)
+def get_rm():
+    return pyvisa.ResourceManager(VISA_LIBRARY)
+
+# Open resource and return it if *IDN? identifies a DL3031, else None
+def _open_if_dl3031(resource):
+    try:
+        inst = get_rm().open_resource(resource, timeout=5000,
+                                      write_termination='\n', read_termination='\n')
+    except pyvisa.errors.VisaIOError:
+        return None
+    try:
+        if "DL3031" in inst.query("*IDN?"):
+            return inst
+    except pyvisa.errors.VisaIOError:
+        pass
+    inst.close()
+    return None
+
+# Last DL3031 resource string from RESOURCE_CACHE (None if missing/unreadable)
+def _cached_resource():
+    try:
+        return RESOURCE_CACHE.read_text().strip() or None
+    except OSError:
+        return None
+
+# Remember the DL3031 resource string; a failed write only costs a rescan next run
+def _save_resource(resource):
+    try:
+        RESOURCE_CACHE.write_text(resource)
+    except OSError as e:
+        print(f"⚠️ Could not cache VISA resource in {RESOURCE_CACHE}: {e}")
+
+# Drop a cached resource that no longer answers as a DL3031
+def _forget_resource():
+    try:
+        RESOURCE_CACHE.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+# Open the DL3031. The cached resource is tried first so normal runs skip
+# list_resources(); it is only trusted if *IDN? still reports a DL3031,
+# otherwise the USB instruments are rescanned and the cache is rewritten.
+def open_dl3031():
+    cached = _cached_resource()
+    if cached:
+        inst = _open_if_dl3031(cached)
+        if inst:
+            return inst
+        _forget_resource()
+
+    for resource in get_rm().list_resources(USB_QUERY):
+        if resource == cached:
+            continue
+        inst = _open_if_dl3031(resource)
+        if inst:
+            _save_resource(resource)
+            return inst
+
+    raise RuntimeError("No Rigol DL3031 found. Check connections and drivers.")
+
+# Voltage and current in one transaction. The DL3031 has no array/binary
+# fetch of measurement data, so a compound ASCII query is the bulk read.
+def measure_vi(inst):
+    inst.write_raw(MEAS_VI)
+    v_str, i_str = inst.read().split(';')
+    return float(v_str), float(i_str)